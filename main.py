@@ -1,19 +1,49 @@
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 import swisseph as swe
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from bisect import bisect_right
+import heapq
+from operator import itemgetter
 import math
 import os
 
-app = FastAPI(title="AstroInsight Ephemeris API", version="3.0")
-
-# Usa Moshier ephemeris built-in (no file esterni necessari)
-swe.set_ephe_path('')
+@asynccontextmanager
+async def lifespan(app):
+    # Riscaldamento all'avvio: il primo calcolo inizializza le tabelle di Swiss Ephemeris,
+    # apre i file (Chirone) e riempie le tabelle di aspect_buckets, invece di pesare sulla
+    # prima richiesta. Best effort: se manca un file d'efemeride l'errore resta alle richieste
+    try:
+        calc_natal_chart(BirthData(year=2000, month=1, day=1))
+        phase_instant(0)
+    except swe.Error:
+        pass
+    yield
+
+# orjson serializza i payload (dict annidati di float/stringhe) molto più in fretta di json.
+# Gli endpoint di calcolo restituiscono già un ORJSONResponse: così FastAPI non fa passare
+# la risposta per jsonable_encoder, che visiterebbe ogni dict in Python (~1 ms per /natal)
+app = FastAPI(title="AstroInsight Ephemeris API", version="3.0",
+              default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Percorso dei file .se1, impostato una volta all'import (SE_EPHE_PATH). Se vuoto vale il
+# percorso di ricerca compilato in Swiss Ephemeris, '.:/users/ephe2/:/users/ephe/'.
+# Servono per EPHE_MODE=swiss e, anche con Moshier, per Chirone (seas_*.se1)
+swe.set_ephe_path(os.environ.get('SE_EPHE_PATH', ''))
 
 # Flag globale per usare Moshier quando Swiss Ephemeris non disponibile
 SEFLG_MOSEPH = swe.FLG_MOSEPH
 
+# EPHE_MODE=swiss usa i file Swiss Ephemeris (più precisi, I/O su disco);
+# default Moshier: semi-analitico, solo calcolo, nessun accesso ai file
+EPHE_MODE = os.environ.get('EPHE_MODE', 'moshier').lower()
+EPHE_FLAG = swe.FLG_SWIEPH if EPHE_MODE == 'swiss' else SEFLG_MOSEPH
+IFLAG = EPHE_FLAG | swe.FLG_SPEED
+
 # ─── COSTANTI ────────────────────────────────────────────────────────────────
 
 PLANETS = {
@@ -30,8 +60,20 @@ PLANETS = {
     'chirone': swe.CHIRON,
 }
 
+# Nomi e id dei corpi come tuple parallele, nell'ordine di PLANETS
+PLANET_NAMES = tuple(PLANETS)
+PLANET_IDS = tuple(PLANETS.values())
+
+# Corpi calcolati insieme per ogni jd: i pianeti per primi (zip con PLANET_NAMES
+# li seleziona), poi nodo vero e Lilith (apogeo lunare medio)
+BODY_IDS = PLANET_IDS + (swe.TRUE_NODE, swe.MEAN_APOG)
+NODE_IDX, LILITH_IDX = len(PLANET_IDS), len(PLANET_IDS) + 1
+
 SIGNS = ['Ariete','Toro','Gemelli','Cancro','Leone','Vergine',
          'Bilancia','Scorpione','Sagittario','Capricorno','Acquario','Pesci']
+SIGNS_T = tuple(SIGNS)
+# Numero di segno per grado intero 0-359: segno = SIGN_OF_DEG[int(l)], gradi = l - 30 * segno
+SIGN_OF_DEG = tuple(d // 30 for d in range(360))
 
 SIGNS_EN = ['Aries','Taurus','Gemini','Cancer','Leo','Virgo',
             'Libra','Scorpio','Sagittarius','Capricorn','Aquarius','Pisces']
@@ -54,6 +96,13 @@ DIGNITIES = {
     'chirone':   {'domicilio': ['Vergine'], 'esaltazione': [], 'esilio': [], 'caduta': []},
 }
 
+# (pianeta, segno) -> dignità. Scorrendo dallo stato più debole al più forte l'ultimo
+# vince, quindi domicilio > esaltazione > esilio > caduta (Mercurio in Vergine = domicilio)
+DIGNITY_LOOKUP = {(planet, sign): status
+                  for planet, d in DIGNITIES.items()
+                  for status in ('caduta', 'esilio', 'esaltazione', 'domicilio')
+                  for sign in d[status]}
+
 # ELEMENTI E QUALITÀ
 ELEMENT = {'Ariete':'Fuoco','Toro':'Terra','Gemelli':'Aria','Cancro':'Acqua',
            'Leone':'Fuoco','Vergine':'Terra','Bilancia':'Aria','Scorpione':'Acqua',
@@ -66,110 +115,215 @@ QUALITY = {'Ariete':'Cardinale','Toro':'Fisso','Gemelli':'Mutabile','Cancro':'Ca
 # POLARITÀ
 POLARITY = {'Fuoco':'Maschile','Terra':'Femminile','Aria':'Maschile','Acqua':'Femminile'}
 
+# Proprietà per segno in un'unica riga (segno, elemento, qualità, polarità),
+# indicizzata per numero di segno (0 = Ariete) o per nome
+SIGN_TABLE = tuple((s, ELEMENT[s], QUALITY[s], POLARITY[ELEMENT[s]]) for s in SIGNS)
+SIGN_PROPS = {row[0]: row for row in SIGN_TABLE}
+
+# GOVERNATORI DEI SEGNI E PESI PER IL PIANETA DOMINANTE
+RULERS = {
+    'Ariete': 'marte', 'Toro': 'venere', 'Gemelli': 'mercurio', 'Cancro': 'luna',
+    'Leone': 'sole', 'Vergine': 'mercurio', 'Bilancia': 'venere', 'Scorpione': 'plutone',
+    'Sagittario': 'giove', 'Capricorno': 'saturno', 'Acquario': 'urano', 'Pesci': 'nettuno'
+}
+WEIGHTS = {'sole': 5, 'luna': 4, 'ascendente': 4, 'mercurio': 2,
+           'venere': 2, 'marte': 2, 'giove': 2, 'saturno': 2,
+           'urano': 1, 'nettuno': 1, 'plutone': 1, 'chirone': 1}
+
+# FASI LUNARI (settori di 45° dell'elongazione Luna-Sole)
+MOON_PHASES = ("Luna Nuova", "Luna Crescente", "Primo Quarto", "Gibbosa Crescente",
+               "Luna Piena", "Gibbosa Calante", "Ultimo Quarto", "Luna Calante")
+
+# ASPETTI
+# (angolo, nome, orb, emoji, tipo); 'major'/'minor' = orb_major/orb_minor di calc_aspects
+ASPECT_TYPES = (
+    (0,   "congiunzione", 'major', "🔴", "neutro"),
+    (30,  "semisestile", 2, "🟡", "minore"),
+    (45,  "semiquadrato", 2, "🟠", "minore"),
+    (60,  "sestile", 'minor', "🟢", "armonico"),
+    (72,  "quintile", 2, "🟣", "minore"),
+    (90,  "quadratura", 'major', "🔴", "tensione"),
+    (120, "trigono", 'major', "🟢", "armonico"),
+    (135, "sesquiquadrato", 2, "🟠", "minore"),
+    (150, "quinconce", 3, "🟡", "neutro"),
+    (180, "opposizione", 'major', "🔴", "tensione"),
+)
+
 # ─── FUNZIONI BASE ────────────────────────────────────────────────────────────
 
+def sign_split(long):
+    # (numero di segno 0-11, gradi nel segno arrotondati a 2 decimali) di una longitudine
+    long %= 360
+    sign_idx = SIGN_OF_DEG[int(long)]
+    return sign_idx, round(long - 30 * sign_idx, 2)
+
 def deg_to_sign(deg):
-    deg = deg % 360
-    sign_idx = int(deg / 30)
-    deg_in_sign = round(deg % 30, 2)
-    return SIGNS[sign_idx], deg_in_sign
+    sign_idx, deg_in_sign = sign_split(deg)
+    return SIGNS_T[sign_idx], deg_in_sign
+
+def degs_to_signs(degs):
+    # Come deg_to_sign, su una sequenza di longitudini
+    return [deg_to_sign(deg) for deg in degs]
 
+@lru_cache(maxsize=8192)
 def calc_jd(year, month, day, hour=12, minute=0):
     return swe.julday(year, month, day, hour + minute/60)
 
-def planet_data(jd, planet_id):
-    pos, _ = swe.calc_ut(jd, planet_id, swe.FLG_MOSEPH | swe.FLG_SPEED)
-    sign, deg = deg_to_sign(pos[0])
+def sign_record(long):
+    sign, deg = deg_to_sign(long)
+    return {"segno": sign, "gradi": deg, "longitudine": round(long, 4)}
+
+def sign_records(longs):
+    # Come sign_record, per più punti della carta in un solo passaggio
+    return [{"segno": sign, "gradi": deg, "longitudine": round(long, 4)}
+            for long, (sign, deg) in zip(longs, degs_to_signs(longs))]
+
+def angdiff(a, b):
+    # Distanza angolare tra due longitudini, 0-180°
+    d = abs(a - b) % 360
+    return 360 - d if d > 180 else d
+
+def moon_phase(sun_long, moon_long):
+    phase_deg = (moon_long - sun_long) % 360
+    # min(): (x % 360) può valere 360.0 per x negativi minuscoli
+    return MOON_PHASES[min(int(phase_deg // 45), 7)], phase_deg
+
+def jd_to_date_str(jd):
+    # "gg/mm/aaaa" del giorno civile (UT) che contiene jd: revjul è l'inverso di swe.julday
+    # (stesso calendario di calc_jd), senza passare da datetime
+    year, month, day, _ = swe.revjul(jd)
+    return f"{day:02d}/{month:02d}/{year}"
+
+def utc_now():
+    # Ora UTC troncata al minuto: le richieste dello stesso minuto condividono jd e cache
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    return now, calc_jd(now.year, now.month, now.day, now.hour, now.minute)
+
+@lru_cache(maxsize=1024)
+def calc_ut_cached(jd, planet_id):
+    # Un solo corpo per jd (il Sole nella ricerca di /solar_return, 3-4 passi per richiesta);
+    # le carte complete passano da calc_ut_batch. La tupla restituita è immutabile
+    pos, _ = swe.calc_ut(jd, planet_id, IFLAG)
+    return pos
+
+@lru_cache(maxsize=16384)
+def calc_houses(jd, lat, lon):
+    # Placidus è una ricerca iterativa costosa: stesso jd/luogo → stesse cuspidi e angoli
+    return swe.houses(jd, lat, lon, b'P')
+
+@lru_cache(maxsize=8192)
+def calc_ut_batch(jd):
+    # Tutti i corpi di BODY_IDS per lo stesso jd in una sola passata
+    return tuple(swe.calc_ut(jd, pid, IFLAG)[0] for pid in BODY_IDS)
+
+def planet_record(pos):
+    sign_idx, deg = sign_split(pos[0])
+    sign, element, quality, _ = SIGN_TABLE[sign_idx]
     return {
         "longitudine": round(pos[0], 4),
         "segno": sign,
         "gradi": deg,
-        "elemento": ELEMENT.get(sign, ''),
-        "qualita": QUALITY.get(sign, ''),
+        "elemento": element,
+        "qualita": quality,
         "retrogrado": pos[3] < 0,
         "velocita": round(pos[3], 4)
     }
 
+def calc_planets(jd):
+    return {name: planet_record(pos) for name, pos in zip(PLANET_NAMES, calc_ut_batch(jd))}
+
+def longitudes(planets):
+    # nome -> longitudine da un dict di record (calc_planets, calc_composite, ...)
+    return {name: pd['longitudine'] for name, pd in planets.items()}
+
 def calc_lilith(jd):
-    pos, _ = swe.calc_ut(jd, swe.MEAN_APOG, swe.FLG_MOSEPH)
-    sign, deg = deg_to_sign(pos[0])
-    return {"segno": sign, "gradi": deg, "longitudine": round(pos[0], 4)}
+    return sign_record(calc_ut_batch(jd)[LILITH_IDX][0])
 
 def calc_nodes(jd):
-    pos_n, _ = swe.calc_ut(jd, swe.TRUE_NODE, swe.FLG_MOSEPH)
-    sign_n, deg_n = deg_to_sign(pos_n[0])
-    pos_s = (pos_n[0] + 180) % 360
-    sign_s, deg_s = deg_to_sign(pos_s)
-    return {
-        "nodo_nord": {"segno": sign_n, "gradi": deg_n, "longitudine": round(pos_n[0], 4)},
-        "nodo_sud": {"segno": sign_s, "gradi": deg_s, "longitudine": round(pos_s, 4)}
-    }
+    pos_n = calc_ut_batch(jd)[NODE_IDX][0]
+    nord, sud = sign_records((pos_n, (pos_n + 180) % 360))
+    return {"nodo_nord": nord, "nodo_sud": sud}
+
+@lru_cache(maxsize=4096)
+def natal_longitudes(year, month, day, hour, minute):
+    # Longitudini natali (pianeti + nodo nord) come coppie immutabili: usare dict(...)
+    jd = calc_jd(year, month, day, hour, minute)
+    batch = calc_ut_batch(jd)
+    longs = [(name, pos[0]) for name, pos in zip(PLANET_NAMES, batch)]
+    longs.append(('nodo_nord', round(batch[NODE_IDX][0], 4)))
+    return tuple(longs)
+
+@lru_cache(maxsize=32)
+def aspect_buckets(orb_major=8, orb_minor=6):
+    orbs = {'major': orb_major, 'minor': orb_minor}
+    aspect_types = [(angle, name, orbs.get(orb, orb), emoji, tipo)
+                    for angle, name, orb, emoji, tipo in ASPECT_TYPES]
+    # buckets[k] = aspetti raggiungibili da una distanza diff con int(diff) == k:
+    # per ogni coppia si confrontano solo questi (di solito 0 o 1) invece di tutti
+    buckets = [[] for _ in range(181)]
+    for asp in aspect_types:
+        angle, orb = asp[0], asp[2]
+        for k in range(max(0, math.floor(angle - orb)), min(180, math.floor(angle + orb)) + 1):
+            buckets[k].append(asp)
+    return tuple(tuple(b) for b in buckets)
+
+def aspect_hits(names_a, longs_a, names_b, longs_b, same, buckets):
+    # Nucleo numerico di calc_aspects su colonne parallele di nomi/longitudini:
+    # restituisce (i, j, aspetto, orb, distanza) senza costruire alcun dict
+    hits = []
+    n_b = len(longs_b)
+    for i, a_long in enumerate(longs_a):
+        a_name = names_a[i]
+        # same = aspetti interni di una carta: ogni coppia una sola volta (j > i)
+        for j in range(i + 1 if same else 0, n_b):
+            if a_name == names_b[j]:
+                continue
+            diff = angdiff(a_long, longs_b[j])
+            for asp in buckets[int(diff)]:
+                delta = abs(diff - asp[0])
+                if delta <= asp[2]:
+                    hits.append((i, j, asp, delta, diff))
+    return hits
 
 def calc_aspects(planets_a, planets_b, label_a="", label_b="", orb_major=8, orb_minor=6):
-    aspect_types = {
-        0:   ("congiunzione", orb_major, "🔴", "neutro"),
-        30:  ("semisestile", 2, "🟡", "minore"),
-        45:  ("semiquadrato", 2, "🟠", "minore"),
-        60:  ("sestile", orb_minor, "🟢", "armonico"),
-        72:  ("quintile", 2, "🟣", "minore"),
-        90:  ("quadratura", orb_major, "🔴", "tensione"),
-        120: ("trigono", orb_major, "🟢", "armonico"),
-        135: ("sesquiquadrato", 2, "🟠", "minore"),
-        150: ("quinconce", 3, "🟡", "neutro"),
-        180: ("opposizione", orb_major, "🔴", "tensione"),
-    }
-    aspects = []
-    seen = set()
-    for a_name, a_long in planets_a.items():
-        for b_name, b_long in planets_b.items():
-            if a_name == b_name:
-                continue
-            key = tuple(sorted([a_name, b_name]))
-            if key in seen and label_a == label_b:
-                continue
-            seen.add(key)
-            diff = abs(a_long - b_long) % 360
-            if diff > 180:
-                diff = 360 - diff
-            for angle, (asp_name, orb, emoji, tipo) in aspect_types.items():
-                if abs(diff - angle) <= orb:
-                    aspects.append({
-                        "pianeta_a": f"{label_a}{a_name}" if label_a else a_name,
-                        "pianeta_b": f"{label_b}{b_name}" if label_b else b_name,
-                        "aspetto": asp_name,
-                        "emoji": emoji,
-                        "tipo": tipo,
-                        "angolo_esatto": angle,
-                        "orb": round(abs(diff - angle), 2),
-                        "applicante": diff < angle
-                    })
-    aspects.sort(key=lambda x: x["orb"])
+    names_a, names_b = list(planets_a), list(planets_b)
+    hits = aspect_hits(names_a, list(planets_a.values()), names_b, list(planets_b.values()),
+                       label_a == label_b, aspect_buckets(orb_major, orb_minor))
+    labels_a = [f"{label_a}{n}" if label_a else n for n in names_a]
+    labels_b = [f"{label_b}{n}" if label_b else n for n in names_b]
+    aspects = [{
+        "pianeta_a": labels_a[i],
+        "pianeta_b": labels_b[j],
+        "aspetto": asp_name,
+        "emoji": emoji,
+        "tipo": tipo,
+        "angolo_esatto": angle,
+        "orb": round(delta, 2),
+        "applicante": diff < angle
+    } for i, j, (angle, asp_name, _, emoji, tipo), delta, diff in hits]
+    # Non ordinati: chi ne mostra solo i primi usa top_aspects
     return aspects
 
+# Chiave di ordinamento degli aspetti, creata una volta sola
+ORB_KEY = itemgetter("orb")
+
+def top_aspects(aspects, n):
+    # I primi n per orb, come sorted(...)[:n] (stesso ordine a parità) senza ordinare tutto
+    return heapq.nsmallest(n, aspects, key=ORB_KEY)
+
 def calc_dignity(planet_name, sign):
-    if planet_name not in DIGNITIES:
-        return "neutro"
-    d = DIGNITIES[planet_name]
-    if sign in d['domicilio']:
-        return "domicilio"
-    if sign in d['esaltazione']:
-        return "esaltazione"
-    if sign in d['esilio']:
-        return "esilio"
-    if sign in d['caduta']:
-        return "caduta"
-    return "neutro"
-
-def calc_planet_in_house(planet_long, houses):
-    for i in range(12):
-        h_start = houses[i]
-        h_end = houses[(i + 1) % 12]
-        if h_end < h_start:
-            h_end += 360
-        p = planet_long if planet_long >= h_start else planet_long + 360
-        if h_start <= p < h_end:
-            return HOUSES_LABELS[i]
-    return "I"
+    return DIGNITY_LOOKUP.get((planet_name, sign), "neutro")
+
+def house_offsets(houses):
+    # Cuspidi come distanze crescenti dalla I (0..360°): la casa si trova per bisezione
+    start = houses[0]
+    return [(h - start) % 360 for h in houses]
+
+def calc_planet_in_house(planet_long, houses, offsets=None):
+    # offsets: house_offsets(houses), da calcolare una volta per carta
+    if offsets is None:
+        offsets = house_offsets(houses)
+    return HOUSES_LABELS[bisect_right(offsets, (planet_long - houses[0]) % 360) - 1]
 
 # ─── PATTERN ASTROLOGICI ─────────────────────────────────────────────────────
 
@@ -177,15 +331,30 @@ def detect_patterns(longs_map):
     patterns = []
     names = list(longs_map.keys())
     longs = list(longs_map.values())
+    n = len(names)
+
+    # Matrice delle distanze angolari (0-180°), calcolata una sola volta per coppia
+    dist = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i+1, n):
+            dist[i][j] = dist[j][i] = angdiff(longs[i], longs[j])
+
+    def near(angle, orb):
+        # Per ogni pianeta, gli indici (crescenti) dei pianeti a angle±orb da lui
+        return [[j for j in range(n) if abs(dist[i][j]-angle) <= orb] for i in range(n)]
+
+    trines = near(120, 8)
+    squares = near(90, 8)
+    opps = near(180, 8)
+    sextiles = near(60, 6)
+    quincunxes = near(150, 3)
 
     # Grand Trine — tre pianeti a ~120° l'uno dall'altro
-    for i in range(len(names)):
-        for j in range(i+1, len(names)):
-            for k in range(j+1, len(names)):
-                d1 = abs(longs[i]-longs[j])%360; d1=min(d1,360-d1)
-                d2 = abs(longs[j]-longs[k])%360; d2=min(d2,360-d2)
-                d3 = abs(longs[i]-longs[k])%360; d3=min(d3,360-d3)
-                if all(abs(d-120)<=8 for d in [d1,d2,d3]):
+    for i in range(n):
+        for j in trines[i]:
+            if j <= i: continue
+            for k in trines[j]:
+                if k > j and k in trines[i]:
                     elem = ELEMENT.get(deg_to_sign(longs[i])[0],'')
                     patterns.append({
                         "nome": "Gran Trigono",
@@ -196,59 +365,49 @@ def detect_patterns(longs_map):
                     })
 
     # T-Square — due pianeti in opposizione + uno in quadratura ad entrambi
-    for i in range(len(names)):
-        for j in range(i+1, len(names)):
-            d_opp = abs(longs[i]-longs[j])%360; d_opp=min(d_opp,360-d_opp)
-            if abs(d_opp-180)<=8:
-                for k in range(len(names)):
-                    if k==i or k==j: continue
-                    d1=abs(longs[k]-longs[i])%360; d1=min(d1,360-d1)
-                    d2=abs(longs[k]-longs[j])%360; d2=min(d2,360-d2)
-                    if abs(d1-90)<=8 and abs(d2-90)<=8:
-                        patterns.append({
-                            "nome": "T-Quadrato",
-                            "emoji": "⚡",
-                            "pianeti": [names[i], names[j], names[k]],
-                            "vertice": names[k],
-                            "descrizione": f"T-quadrato con vertice in {names[k]} — tensione e drive verso la crescita"
-                        })
+    for i in range(n):
+        for j in opps[i]:
+            if j <= i: continue
+            for k in squares[i]:
+                if k in squares[j]:
+                    patterns.append({
+                        "nome": "T-Quadrato",
+                        "emoji": "⚡",
+                        "pianeti": [names[i], names[j], names[k]],
+                        "vertice": names[k],
+                        "descrizione": f"T-quadrato con vertice in {names[k]} — tensione e drive verso la crescita"
+                    })
 
     # Grand Cross — quattro pianeti, due opposizioni incrociate
-    for i in range(len(names)):
-        for j in range(i+1, len(names)):
-            d1=abs(longs[i]-longs[j])%360; d1=min(d1,360-d1)
-            if abs(d1-180)<=8:
-                for k in range(j+1, len(names)):
-                    for l in range(k+1, len(names)):
-                        d2=abs(longs[k]-longs[l])%360; d2=min(d2,360-d2)
-                        if abs(d2-180)<=8:
-                            d3=abs(longs[i]-longs[k])%360; d3=min(d3,360-d3)
-                            if abs(d3-90)<=8:
-                                patterns.append({
-                                    "nome": "Croce Cardinale",
-                                    "emoji": "✚",
-                                    "pianeti": [names[i], names[j], names[k], names[l]],
-                                    "descrizione": "Grande croce — sfide intense ma forza eccezionale"
-                                })
-
-    # Yod — due pianeti in sestile, entrambi in quinconce con un terzo
-    for i in range(len(names)):
-        for j in range(i+1, len(names)):
-            d_sest=abs(longs[i]-longs[j])%360; d_sest=min(d_sest,360-d_sest)
-            if abs(d_sest-60)<=6:
-                for k in range(len(names)):
-                    if k==i or k==j: continue
-                    d1=abs(longs[k]-longs[i])%360; d1=min(d1,360-d1)
-                    d2=abs(longs[k]-longs[j])%360; d2=min(d2,360-d2)
-                    if abs(d1-150)<=3 and abs(d2-150)<=3:
+    # (si scorrono solo le opposizioni, i < j < k < l come nella ricerca esaustiva)
+    for i in range(n):
+        for j in opps[i]:
+            if j <= i: continue
+            for k in squares[i]:
+                if k <= j: continue
+                for l in opps[k]:
+                    if l > k:
                         patterns.append({
-                            "nome": "Yod (Dito di Dio)",
-                            "emoji": "☝️",
-                            "pianeti": [names[i], names[j], names[k]],
-                            "vertice": names[k],
-                            "descrizione": f"Yod con vertice in {names[k]} — missione karmica speciale"
+                            "nome": "Croce Cardinale",
+                            "emoji": "✚",
+                            "pianeti": [names[i], names[j], names[k], names[l]],
+                            "descrizione": "Grande croce — sfide intense ma forza eccezionale"
                         })
 
+    # Yod — due pianeti in sestile, entrambi in quinconce con un terzo
+    for i in range(n):
+        for j in sextiles[i]:
+            if j <= i: continue
+            for k in quincunxes[i]:
+                if k in quincunxes[j]:
+                    patterns.append({
+                        "nome": "Yod (Dito di Dio)",
+                        "emoji": "☝️",
+                        "pianeti": [names[i], names[j], names[k]],
+                        "vertice": names[k],
+                        "descrizione": f"Yod con vertice in {names[k]} — missione karmica speciale"
+                    })
+
     # Stellium — 3+ pianeti nello stesso segno
     sign_groups = {}
     for name, long in longs_map.items():
@@ -267,7 +426,10 @@ def detect_patterns(longs_map):
 
 # ─── PARTI ARABE ─────────────────────────────────────────────────────────────
 
-def calc_arabic_parts(asc, sun, moon, mars, saturn, jupiter, mercury, venus, planets_map):
+def calc_arabic_parts(asc, planets_map):
+    sun, moon, mars = planets_map['sole'], planets_map['luna'], planets_map['marte']
+    saturn, jupiter = planets_map['saturno'], planets_map['giove']
+    mercury, venus = planets_map['mercurio'], planets_map['venere']
     parts = {}
     def part(formula):
         return round(formula % 360, 4)
@@ -337,10 +499,7 @@ def calc_arabic_parts(asc, sun, moon, mars, saturn, jupiter, mercury, venus, pla
 def calc_secondary_progressions(birth_jd, age_years):
     # Un giorno = un anno (progressioni secondarie)
     progressed_jd = birth_jd + age_years
-    planets_prog = {}
-    for name, pid in PLANETS.items():
-        planets_prog[name] = planet_data(progressed_jd, pid)
-    return planets_prog
+    return calc_planets(progressed_jd)
 
 # ─── DISTRIBUZIONE ELEMENTI/QUALITÀ ──────────────────────────────────────────
 
@@ -350,13 +509,10 @@ def calc_distribution(planets_data):
     polarities = {'Maschile': [], 'Femminile': []}
 
     for name, pd in planets_data.items():
-        sign = pd['segno']
-        el = ELEMENT.get(sign, '')
-        qu = QUALITY.get(sign, '')
-        po = POLARITY.get(el, '')
-        if el: elements[el].append(name)
-        if qu: qualities[qu].append(name)
-        if po: polarities[po].append(name)
+        _, el, qu, po = SIGN_PROPS[pd['segno']]
+        elements[el].append(name)
+        qualities[qu].append(name)
+        polarities[po].append(name)
 
     dominant_element = max(elements, key=lambda k: len(elements[k]))
     dominant_quality = max(qualities, key=lambda k: len(qualities[k]))
@@ -371,88 +527,171 @@ def calc_distribution(planets_data):
 
 # ─── CARTA COMPOSITA ─────────────────────────────────────────────────────────
 
+def midpoint(a, b):
+    # Punto medio sull'arco più corto, senza rami: +360 solo se gli archi superano 180°
+    return (a + b + 360 * (abs(a - b) > 180)) / 2 % 360
+
 def calc_composite(planets1, planets2, asc1, asc2):
     composite = {}
-    for name in planets1:
-        l1 = planets1[name]['longitudine']
-        l2 = planets2[name]['longitudine']
-        # Metodo del punto medio
-        diff = abs(l1 - l2)
-        if diff > 180:
-            mid = ((l1 + l2 + 360) / 2) % 360
-        else:
-            mid = (l1 + l2) / 2
-        sign, deg = deg_to_sign(mid)
+    for name, pd1 in planets1.items():
+        mid = midpoint(pd1['longitudine'], planets2[name]['longitudine'])
+        sign_idx, deg = sign_split(mid)
+        sign, element, quality, _ = SIGN_TABLE[sign_idx]
         composite[name] = {
             "longitudine": round(mid, 4),
             "segno": sign,
             "gradi": deg,
-            "elemento": ELEMENT.get(sign, ''),
-            "qualita": QUALITY.get(sign, '')
+            "elemento": element,
+            "qualita": quality
         }
     # Ascendente composito
-    diff_asc = abs(asc1 - asc2)
-    if diff_asc > 180:
-        mid_asc = ((asc1 + asc2 + 360) / 2) % 360
-    else:
-        mid_asc = (asc1 + asc2) / 2
-    asc_sign, asc_deg = deg_to_sign(mid_asc)
-    composite['ascendente'] = {"segno": asc_sign, "gradi": asc_deg, "longitudine": round(mid_asc, 4)}
+    composite['ascendente'] = sign_record(midpoint(asc1, asc2))
     return composite
 
+# ─── FASI LUNARI (Meeus, Astronomical Algorithms cap. 49) ────────────────────
+
+# Nome della fase per q % 4, con k = q/4 lunazioni dal novilunio del 6/1/2000
+LUNAR_PHASE_NAMES = ("Luna Nuova 🌑", "Primo Quarto 🌓", "Luna Piena 🌕", "Ultimo Quarto 🌗")
+
+# Termini periodici: (coefficiente in giorni, potenza di E, multipli di M, M', F, Ω)
+PHASE_TERMS_NEW = (
+    (-0.40720, 0, 0, 1, 0, 0), (0.17241, 1, 1, 0, 0, 0), (0.01608, 0, 0, 2, 0, 0),
+    (0.01039, 0, 0, 0, 2, 0), (0.00739, 1, -1, 1, 0, 0), (-0.00514, 1, 1, 1, 0, 0),
+    (0.00208, 2, 2, 0, 0, 0), (-0.00111, 0, 0, 1, -2, 0), (-0.00057, 0, 0, 1, 2, 0),
+    (0.00056, 1, 1, 2, 0, 0), (-0.00042, 0, 0, 3, 0, 0), (0.00042, 1, 1, 0, 2, 0),
+    (0.00038, 1, 1, 0, -2, 0), (-0.00024, 1, -1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1),
+    (-0.00007, 0, 2, 1, 0, 0), (0.00004, 0, 0, 2, -2, 0), (0.00004, 0, 3, 0, 0, 0),
+    (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 0, 2, 2, 0), (-0.00003, 0, 1, 1, 2, 0),
+    (0.00003, 0, -1, 1, 2, 0), (-0.00002, 0, -1, 1, -2, 0), (-0.00002, 0, 1, 3, 0, 0),
+    (0.00002, 0, 0, 4, 0, 0),
+)
+PHASE_TERMS_FULL = (
+    (-0.40614, 0, 0, 1, 0, 0), (0.17302, 1, 1, 0, 0, 0), (0.01614, 0, 0, 2, 0, 0),
+    (0.01043, 0, 0, 0, 2, 0), (0.00734, 1, -1, 1, 0, 0), (-0.00515, 1, 1, 1, 0, 0),
+    (0.00209, 2, 2, 0, 0, 0), (-0.00111, 0, 0, 1, -2, 0), (-0.00057, 0, 0, 1, 2, 0),
+    (0.00056, 1, 1, 2, 0, 0), (-0.00042, 0, 0, 3, 0, 0), (0.00042, 1, 1, 0, 2, 0),
+    (0.00038, 1, 1, 0, -2, 0), (-0.00024, 1, -1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1),
+    (-0.00007, 0, 2, 1, 0, 0), (0.00004, 0, 0, 2, -2, 0), (0.00004, 0, 3, 0, 0, 0),
+    (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 0, 2, 2, 0), (-0.00003, 0, 1, 1, 2, 0),
+    (0.00003, 0, -1, 1, 2, 0), (-0.00002, 0, -1, 1, -2, 0), (-0.00002, 0, 1, 3, 0, 0),
+    (0.00002, 0, 0, 4, 0, 0),
+)
+PHASE_TERMS_QUARTER = (
+    (-0.62801, 0, 0, 1, 0, 0), (0.17172, 1, 1, 0, 0, 0), (-0.01183, 1, 1, 1, 0, 0),
+    (0.00862, 0, 0, 2, 0, 0), (0.00804, 0, 0, 0, 2, 0), (0.00454, 1, -1, 1, 0, 0),
+    (0.00204, 2, 2, 0, 0, 0), (-0.00180, 0, 0, 1, -2, 0), (-0.00070, 0, 0, 1, 2, 0),
+    (-0.00040, 0, 0, 3, 0, 0), (-0.00034, 1, -1, 2, 0, 0), (0.00032, 1, 1, 0, 2, 0),
+    (0.00032, 1, 1, 0, -2, 0), (-0.00028, 2, 2, 1, 0, 0), (0.00027, 1, 1, 2, 0, 0),
+    (-0.00017, 0, 0, 0, 0, 1), (-0.00005, 0, -1, 1, -2, 0), (0.00004, 0, 0, 2, 2, 0),
+    (-0.00004, 0, 1, 1, 2, 0), (0.00004, 0, -2, 1, 0, 0), (0.00003, 0, 1, 1, -2, 0),
+    (0.00003, 0, 3, 0, 0, 0), (0.00002, 0, 0, 2, -2, 0), (0.00002, 0, -1, 1, 2, 0),
+    (-0.00002, 0, 1, 3, 0, 0),
+)
+PHASE_TERMS = (PHASE_TERMS_NEW, PHASE_TERMS_QUARTER, PHASE_TERMS_FULL, PHASE_TERMS_QUARTER)
+
+# Correzioni planetarie comuni a tutte le fasi: (coefficiente, A0, dA/dk)
+PHASE_PLANETARY = (
+    (0.000325, 299.77, 0.107408), (0.000165, 251.88, 0.016321), (0.000164, 251.83, 26.651886),
+    (0.000126, 349.42, 36.412478), (0.000110, 84.66, 18.206239), (0.000062, 141.74, 53.303771),
+    (0.000060, 207.14, 2.453732), (0.000056, 154.84, 7.306860), (0.000047, 34.52, 27.261239),
+    (0.000042, 207.19, 0.121824), (0.000040, 291.34, 1.844379), (0.000037, 161.72, 24.198154),
+    (0.000035, 239.56, 25.513099), (0.000023, 331.55, 3.592518),
+)
+
+def phase_instant(q):
+    # Istante (jd UT) della fase q: k = q/4, fase = q % 4 (0 nuova, 1 primo quarto, ...)
+    k = q / 4
+    t = k / 1236.85
+    t2 = t * t
+    jde = (2451550.09766 + 29.530588861 * k + 0.00015437 * t2
+           - 0.000000150 * t2 * t + 0.00000000073 * t2 * t2)
+    e = 1 - 0.002516 * t - 0.0000074 * t2
+    m = math.radians(2.5534 + 29.10535670 * k - 0.0000014 * t2 - 0.00000011 * t2 * t)
+    mp = math.radians(201.5643 + 385.81693528 * k + 0.0107582 * t2
+                      + 0.00001238 * t2 * t - 0.000000058 * t2 * t2)
+    f = math.radians(160.7108 + 390.67050284 * k - 0.0016118 * t2
+                     - 0.00000227 * t2 * t + 0.000000011 * t2 * t2)
+    om = math.radians(124.7746 - 1.56375588 * k + 0.0020672 * t2 + 0.00000215 * t2 * t)
+
+    phase = q % 4
+    for coef, e_pow, n_m, n_mp, n_f, n_om in PHASE_TERMS[phase]:
+        jde += coef * e ** e_pow * math.sin(n_m * m + n_mp * mp + n_f * f + n_om * om)
+    if phase % 2:
+        w = (0.00306 - 0.00038 * e * math.cos(m) + 0.00026 * math.cos(mp)
+             - 0.00002 * math.cos(mp - m) + 0.00002 * math.cos(mp + m) + 0.00002 * math.cos(2 * f))
+        jde += w if phase == 1 else -w
+
+    planetary = PHASE_PLANETARY[0][1] + PHASE_PLANETARY[0][2] * k - 0.009173 * t2
+    jde += PHASE_PLANETARY[0][0] * math.sin(math.radians(planetary))
+    for coef, a0, a1 in PHASE_PLANETARY[1:]:
+        jde += coef * math.sin(math.radians(a0 + a1 * k))
+    # JDE è in tempo dinamico (TT): riportato a UT come il resto dell'API
+    return jde - swe.deltat(jde)
+
 # ─── MODELS ──────────────────────────────────────────────────────────────────
 
+# Anni calcolabili: Chirone (sempre in carta) è definito dal 4/1/675 (JD 1967601.5),
+# Moshier arriva al 29/4/3003 (JD 2818000.5). 676-2999 lascia margine a progressioni
+# (+150 giorni), /ephemeris e ritorno solare; fuori range 422 invece di un errore swe
+YEAR_MIN, YEAR_MAX = 676, 2999
+
+# Modelli immutabili (frozen): hashabili, quindi usabili come chiavi di lru_cache
 class BirthData(BaseModel):
-    year: int
-    month: int
-    day: int
-    hour: int = 12
-    minute: int = 0
-    latitude: float = 41.9028
-    longitude: float = 12.4964
+    model_config = ConfigDict(frozen=True)
+    year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
+    hour: int = Field(12, ge=0, le=23)
+    minute: int = Field(0, ge=0, le=59)
+    latitude: float = Field(41.9028, ge=-90, le=90)
+    longitude: float = Field(12.4964, ge=-180, le=180)
 
 class TransitRequest(BaseModel):
-    birth_year: int
-    birth_month: int
-    birth_day: int
-    birth_hour: int = 12
-    birth_minute: int = 0
-    latitude: float = 41.9028
-    longitude: float = 12.4964
+    model_config = ConfigDict(frozen=True)
+    birth_year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    birth_month: int = Field(ge=1, le=12)
+    birth_day: int = Field(ge=1, le=31)
+    birth_hour: int = Field(12, ge=0, le=23)
+    birth_minute: int = Field(0, ge=0, le=59)
+    latitude: float = Field(41.9028, ge=-90, le=90)
+    longitude: float = Field(12.4964, ge=-180, le=180)
 
 class SolarReturnRequest(BaseModel):
-    birth_year: int
-    birth_month: int
-    birth_day: int
-    birth_hour: int = 12
-    birth_minute: int = 0
-    current_year: int
-    latitude: float = 41.9028
-    longitude: float = 12.4964
+    model_config = ConfigDict(frozen=True)
+    birth_year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    birth_month: int = Field(ge=1, le=12)
+    birth_day: int = Field(ge=1, le=31)
+    birth_hour: int = Field(12, ge=0, le=23)
+    birth_minute: int = Field(0, ge=0, le=59)
+    current_year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    latitude: float = Field(41.9028, ge=-90, le=90)
+    longitude: float = Field(12.4964, ge=-180, le=180)
 
 class CompatibilityRequest(BaseModel):
-    person1_year: int
-    person1_month: int
-    person1_day: int
-    person1_hour: int = 12
-    person1_minute: int = 0
-    person1_lat: float = 41.9028
-    person1_lon: float = 12.4964
-    person2_year: int
-    person2_month: int
-    person2_day: int
-    person2_hour: int = 12
-    person2_minute: int = 0
-    person2_lat: float = 41.9028
-    person2_lon: float = 12.4964
+    model_config = ConfigDict(frozen=True)
+    person1_year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    person1_month: int = Field(ge=1, le=12)
+    person1_day: int = Field(ge=1, le=31)
+    person1_hour: int = Field(12, ge=0, le=23)
+    person1_minute: int = Field(0, ge=0, le=59)
+    person1_lat: float = Field(41.9028, ge=-90, le=90)
+    person1_lon: float = Field(12.4964, ge=-180, le=180)
+    person2_year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    person2_month: int = Field(ge=1, le=12)
+    person2_day: int = Field(ge=1, le=31)
+    person2_hour: int = Field(12, ge=0, le=23)
+    person2_minute: int = Field(0, ge=0, le=59)
+    person2_lat: float = Field(41.9028, ge=-90, le=90)
+    person2_lon: float = Field(12.4964, ge=-180, le=180)
 
 class ProgressionRequest(BaseModel):
-    birth_year: int
-    birth_month: int
-    birth_day: int
-    birth_hour: int = 12
-    birth_minute: int = 0
-    age_years: int
+    model_config = ConfigDict(frozen=True)
+    birth_year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+    birth_month: int = Field(ge=1, le=12)
+    birth_day: int = Field(ge=1, le=31)
+    birth_hour: int = Field(12, ge=0, le=23)
+    birth_minute: int = Field(0, ge=0, le=59)
+    age_years: int = Field(ge=0, le=150)
 
 # ─── ENDPOINTS ───────────────────────────────────────────────────────────────
 
@@ -463,37 +702,31 @@ def root():
         "status": "active",
         "version": "3.0",
         "endpoints": ["/today", "/natal", "/transits", "/solar_return",
-                      "/compatibility", "/progressions", "/lunar_phases", "/ephemeris"]
+                      "/compatibility", "/progressions", "/lunar_phases", "/ephemeris",
+                      "/cache_clear"]
     }
 
 @app.get("/today")
 def today_planets():
-    now = datetime.utcnow()
-    jd = calc_jd(now.year, now.month, now.day, now.hour, now.minute)
-    planets_data = {}
-    for name, pid in PLANETS.items():
-        planets_data[name] = planet_data(jd, pid)
+    return ORJSONResponse(calc_today(*utc_now()))
+
+@lru_cache(maxsize=2)
+def calc_today(now, jd):
+    # Chiave al minuto (utc_now): le richieste dello stesso minuto condividono la risposta
+    planets_data = calc_planets(jd)
     nodes = calc_nodes(jd)
     lilith = calc_lilith(jd)
-    patterns = detect_patterns({n: p['longitudine'] for n, p in planets_data.items()})
+    patterns = detect_patterns(longitudes(planets_data))
     distribution = calc_distribution(planets_data)
 
     # Luna fase
     sun_long = planets_data['sole']['longitudine']
     moon_long = planets_data['luna']['longitudine']
-    moon_phase_deg = (moon_long - sun_long) % 360
-    if moon_phase_deg < 45: phase = "Luna Nuova"
-    elif moon_phase_deg < 90: phase = "Luna Crescente"
-    elif moon_phase_deg < 135: phase = "Primo Quarto"
-    elif moon_phase_deg < 180: phase = "Gibbosa Crescente"
-    elif moon_phase_deg < 225: phase = "Luna Piena"
-    elif moon_phase_deg < 270: phase = "Gibbosa Calante"
-    elif moon_phase_deg < 315: phase = "Ultimo Quarto"
-    else: phase = "Luna Calante"
+    phase, moon_phase_deg = moon_phase(sun_long, moon_long)
 
     return {
-        "data": now.strftime("%d/%m/%Y"),
-        "ora_utc": now.strftime("%H:%M"),
+        "data": f"{now.day:02d}/{now.month:02d}/{now.year}",
+        "ora_utc": f"{now.hour:02d}:{now.minute:02d}",
         "pianeti": planets_data,
         "nodi_lunari": nodes,
         "lilith": lilith,
@@ -505,35 +738,37 @@ def today_planets():
 
 @app.post("/natal")
 def natal_chart(data: BirthData):
+    return ORJSONResponse(calc_natal_chart(data))
+
+@lru_cache(maxsize=1024)
+def calc_natal_chart(data: BirthData):
+    # La carta natale dipende solo dai dati di nascita: risposte identiche rimemorizzate
     jd = calc_jd(data.year, data.month, data.day, data.hour, data.minute)
 
     # Pianeti con dignità e casa
-    houses_raw, ascmc = swe.houses(jd, data.latitude, data.longitude, b'P')
+    houses_raw, ascmc = calc_houses(jd, data.latitude, data.longitude)
     asc_long = ascmc[0]
     mc_long = ascmc[1]
     dsc_long = (asc_long + 180) % 360
     ic_long = (mc_long + 180) % 360
 
-    planets_data = {}
-    for name, pid in PLANETS.items():
-        pd = planet_data(jd, pid)
+    planets_data = calc_planets(jd)
+    # Colonna unica delle longitudini: la usano case, parti arabe, aspetti, pattern e fase lunare
+    long_map = longitudes(planets_data)
+    offsets = house_offsets(houses_raw)
+    for name, pd in planets_data.items():
         pd['dignita'] = calc_dignity(name, pd['segno'])
-        pd['casa'] = calc_planet_in_house(pd['longitudine'], list(houses_raw))
-        planets_data[name] = pd
+        pd['casa'] = calc_planet_in_house(long_map[name], houses_raw, offsets)
 
     nodes = calc_nodes(jd)
     lilith = calc_lilith(jd)
 
     # Case
-    asc_sign, asc_deg = deg_to_sign(asc_long)
-    mc_sign, mc_deg = deg_to_sign(mc_long)
-    dsc_sign, dsc_deg = deg_to_sign(dsc_long)
-    ic_sign, ic_deg = deg_to_sign(ic_long)
+    asc_rec, dsc_rec, mc_rec, ic_rec = sign_records((asc_long, dsc_long, mc_long, ic_long))
 
     houses_data = {}
-    for i, cusp in enumerate(houses_raw):
-        sign, deg = deg_to_sign(cusp)
-        houses_data[HOUSES_LABELS[i]] = {
+    for label, cusp, (sign, deg) in zip(HOUSES_LABELS, houses_raw, degs_to_signs(houses_raw)):
+        houses_data[label] = {
             "segno": sign, "gradi": round(deg, 2),
             "longitudine": round(cusp, 4),
             "elemento": ELEMENT.get(sign, ''),
@@ -541,59 +776,32 @@ def natal_chart(data: BirthData):
         }
 
     # Parti arabe
-    p = planets_data
-    arabic = calc_arabic_parts(
-        asc_long,
-        p['sole']['longitudine'], p['luna']['longitudine'],
-        p['marte']['longitudine'], p['saturno']['longitudine'],
-        p['giove']['longitudine'], p['mercurio']['longitudine'],
-        p['venere']['longitudine'], {n: pd['longitudine'] for n, pd in p.items()}
-    )
-
-    # Aspetti
-    long_map = {name: pd['longitudine'] for name, pd in planets_data.items()}
-    # Aggiungi angoli
-    long_map['ascendente'] = asc_long
-    long_map['medio_cielo'] = mc_long
-    aspects = calc_aspects(long_map, long_map)
+    arabic = calc_arabic_parts(asc_long, long_map)
+
+    # Aspetti (pianeti + angoli)
+    chart_points = {**long_map, 'ascendente': asc_long, 'medio_cielo': mc_long}
+    aspects = calc_aspects(chart_points, chart_points)
 
     # Pattern
-    patterns = detect_patterns({n: pd['longitudine'] for n, pd in planets_data.items()})
+    patterns = detect_patterns(long_map)
 
     # Distribuzione
     distribution = calc_distribution(planets_data)
 
     # Fase lunare alla nascita
-    sun_long = planets_data['sole']['longitudine']
-    moon_long = planets_data['luna']['longitudine']
-    moon_phase_deg = (moon_long - sun_long) % 360
-    if moon_phase_deg < 45: phase = "Luna Nuova"
-    elif moon_phase_deg < 90: phase = "Luna Crescente"
-    elif moon_phase_deg < 135: phase = "Primo Quarto"
-    elif moon_phase_deg < 180: phase = "Gibbosa Crescente"
-    elif moon_phase_deg < 225: phase = "Luna Piena"
-    elif moon_phase_deg < 270: phase = "Gibbosa Calante"
-    elif moon_phase_deg < 315: phase = "Ultimo Quarto"
-    else: phase = "Luna Calante"
+    sun_long = long_map['sole']
+    moon_long = long_map['luna']
+    phase, moon_phase_deg = moon_phase(sun_long, moon_long)
 
     # Dominante astrologico (pianeta che governa il segno con più punti pesanti)
+    # (dict: a parità di punteggio vince il governatore incontrato per primo)
     dominant_score = {}
-    weights = {'sole': 5, 'luna': 4, 'ascendente': 4, 'mercurio': 2,
-               'venere': 2, 'marte': 2, 'giove': 2, 'saturno': 2,
-               'urano': 1, 'nettuno': 1, 'plutone': 1, 'chirone': 1}
-    rulers = {
-        'Ariete': 'marte', 'Toro': 'venere', 'Gemelli': 'mercurio', 'Cancro': 'luna',
-        'Leone': 'sole', 'Vergine': 'mercurio', 'Bilancia': 'venere', 'Scorpione': 'plutone',
-        'Sagittario': 'giove', 'Capricorno': 'saturno', 'Acquario': 'urano', 'Pesci': 'nettuno'
-    }
     for name, pd in planets_data.items():
-        ruler = rulers.get(pd['segno'], '')
-        if ruler:
-            dominant_score[ruler] = dominant_score.get(ruler, 0) + weights.get(name, 1)
+        ruler = RULERS[pd['segno']]
+        dominant_score[ruler] = dominant_score.get(ruler, 0) + WEIGHTS[name]
     # Aggiungi ascendente
-    asc_ruler = rulers.get(asc_sign, '')
-    if asc_ruler:
-        dominant_score[asc_ruler] = dominant_score.get(asc_ruler, 0) + 4
+    asc_ruler = RULERS[asc_rec['segno']]
+    dominant_score[asc_ruler] = dominant_score.get(asc_ruler, 0) + WEIGHTS['ascendente']
 
     dominant_planet = max(dominant_score, key=dominant_score.get) if dominant_score else 'sole'
 
@@ -605,16 +813,16 @@ def natal_chart(data: BirthData):
         },
         "pianeti": planets_data,
         "angoli": {
-            "ascendente": {"segno": asc_sign, "gradi": asc_deg, "longitudine": round(asc_long, 4)},
-            "discendente": {"segno": dsc_sign, "gradi": dsc_deg, "longitudine": round(dsc_long, 4)},
-            "medio_cielo": {"segno": mc_sign, "gradi": mc_deg, "longitudine": round(mc_long, 4)},
-            "fondo_cielo": {"segno": ic_sign, "gradi": ic_deg, "longitudine": round(ic_long, 4)},
+            "ascendente": asc_rec,
+            "discendente": dsc_rec,
+            "medio_cielo": mc_rec,
+            "fondo_cielo": ic_rec,
         },
         "case": houses_data,
         "nodi_lunari": nodes,
         "lilith": lilith,
         "parti_arabe": arabic,
-        "aspetti": aspects[:25],
+        "aspetti": top_aspects(aspects, 25),
         "pattern": patterns,
         "distribuzione": distribution,
         "fase_lunare_nascita": {"fase": phase, "angolo": round(moon_phase_deg, 2)},
@@ -624,27 +832,29 @@ def natal_chart(data: BirthData):
 
 @app.post("/transits")
 def current_transits(data: TransitRequest):
-    now = datetime.utcnow()
-    jd_now = calc_jd(now.year, now.month, now.day, now.hour, now.minute)
+    return ORJSONResponse(calc_transits(data, *utc_now()))
+
+@lru_cache(maxsize=1024)
+def calc_transits(data: TransitRequest, now, jd_now):
+    # Stessi dati di nascita nello stesso minuto → stessa risposta
     jd_natal = calc_jd(data.birth_year, data.birth_month, data.birth_day,
                        data.birth_hour, data.birth_minute)
 
-    natal_planets = {}
-    transit_planets = {}
-    for name, pid in PLANETS.items():
-        pos_n, _ = swe.calc_ut(jd_natal, pid, swe.FLG_MOSEPH)
-        natal_planets[name] = pos_n[0]
-        transit_planets[name] = planet_data(jd_now, pid)
-
-    nodes_natal = calc_nodes(jd_natal)
-    natal_planets['nodo_nord'] = nodes_natal['nodo_nord']['longitudine']
+    natal_planets = dict(natal_longitudes(data.birth_year, data.birth_month, data.birth_day,
+                                          data.birth_hour, data.birth_minute))
+    transit_planets = calc_planets(jd_now)
 
-    houses_natal, ascmc_natal = swe.houses(jd_natal, data.latitude, data.longitude, b'P')
+    houses_natal, ascmc_natal = calc_houses(jd_natal, data.latitude, data.longitude)
     natal_planets['ascendente'] = ascmc_natal[0]
     natal_planets['medio_cielo'] = ascmc_natal[1]
 
-    transit_longs = {name: pd['longitudine'] for name, pd in transit_planets.items()}
+    transit_longs = longitudes(transit_planets)
     aspects = calc_aspects(transit_longs, natal_planets, "T:", "N:")
+    # Una passata per tipo, poi i più stretti di ciascun gruppo
+    by_tipo = {'armonico': [], 'tensione': []}
+    for a in aspects:
+        if a['tipo'] in by_tipo:
+            by_tipo[a['tipo']].append(a)
 
     nodes_now = calc_nodes(jd_now)
     lilith_now = calc_lilith(jd_now)
@@ -652,63 +862,54 @@ def current_transits(data: TransitRequest):
     # Fase lunare attuale
     sun_now = transit_planets['sole']['longitudine']
     moon_now = transit_planets['luna']['longitudine']
-    phase_deg = (moon_now - sun_now) % 360
-    if phase_deg < 45: phase = "Luna Nuova"
-    elif phase_deg < 90: phase = "Luna Crescente"
-    elif phase_deg < 135: phase = "Primo Quarto"
-    elif phase_deg < 180: phase = "Gibbosa Crescente"
-    elif phase_deg < 225: phase = "Luna Piena"
-    elif phase_deg < 270: phase = "Gibbosa Calante"
-    elif phase_deg < 315: phase = "Ultimo Quarto"
-    else: phase = "Luna Calante"
+    phase, _ = moon_phase(sun_now, moon_now)
 
     return {
-        "data_calcolo": now.strftime("%d/%m/%Y %H:%M UTC"),
+        "data_calcolo": f"{now.day:02d}/{now.month:02d}/{now.year} {now.hour:02d}:{now.minute:02d} UTC",
         "pianeti_transito": transit_planets,
         "nodi_transito": nodes_now,
         "lilith_transito": lilith_now,
         "fase_lunare": phase,
-        "aspetti_significativi": aspects[:15],
-        "aspetti_armonici": [a for a in aspects if a['tipo']=='armonico'][:8],
-        "aspetti_tensione": [a for a in aspects if a['tipo']=='tensione'][:8],
+        "aspetti_significativi": top_aspects(aspects, 15),
+        "aspetti_armonici": top_aspects(by_tipo['armonico'], 8),
+        "aspetti_tensione": top_aspects(by_tipo['tensione'], 8),
     }
 
 @app.post("/solar_return")
 def solar_return(data: SolarReturnRequest):
     jd_natal = calc_jd(data.birth_year, data.birth_month, data.birth_day,
                        data.birth_hour, data.birth_minute)
-    pos_natal_sun, _ = swe.calc_ut(jd_natal, swe.SUN, swe.FLG_MOSEPH)
-    natal_sun_long = pos_natal_sun[0]
+    natal_sun_long = calc_ut_cached(jd_natal, swe.SUN)[0]
 
-    jd_search = calc_jd(data.current_year, data.birth_month, max(data.birth_day-2, 1), 0)
+    # Partenza dal compleanno all'ora di nascita: il ritorno cade entro ~1 giorno,
+    # Newton (pos[3] = velocità del Sole in °/giorno, FLG_SPEED) converge in 2-3 passi
+    jd_search = calc_jd(data.current_year, data.birth_month, data.birth_day,
+                        data.birth_hour, data.birth_minute)
     for _ in range(15):
-        pos, _ = swe.calc_ut(jd_search, swe.SUN, swe.FLG_MOSEPH)
+        pos = calc_ut_cached(jd_search, swe.SUN)
         diff = (pos[0] - natal_sun_long + 360) % 360
         if diff > 180: diff -= 360
-        if abs(diff) < 0.0001: break
-        jd_search -= diff / 360
+        if abs(diff) < 1e-6: break
+        jd_search -= diff / pos[3]
 
-    planets_sr = {}
-    for name, pid in PLANETS.items():
-        pd = planet_data(jd_search, pid)
+    planets_sr = calc_planets(jd_search)
+    for name, pd in planets_sr.items():
         pd['dignita'] = calc_dignity(name, pd['segno'])
-        planets_sr[name] = pd
 
-    houses_sr, ascmc_sr = swe.houses(jd_search, data.latitude, data.longitude, b'P')
+    houses_sr, ascmc_sr = calc_houses(jd_search, data.latitude, data.longitude)
     asc_sign, asc_deg = deg_to_sign(ascmc_sr[0])
     mc_sign, mc_deg = deg_to_sign(ascmc_sr[1])
 
     houses_data = {}
-    for i, cusp in enumerate(houses_sr):
-        sign, deg = deg_to_sign(cusp)
-        houses_data[HOUSES_LABELS[i]] = {"segno": sign, "gradi": round(deg, 2)}
+    for label, (sign, deg) in zip(HOUSES_LABELS, degs_to_signs(houses_sr)):
+        houses_data[label] = {"segno": sign, "gradi": round(deg, 2)}
 
-    longs = {n: pd['longitudine'] for n, pd in planets_sr.items()}
+    longs = longitudes(planets_sr)
     aspects = calc_aspects(longs, longs)
     patterns = detect_patterns(longs)
     distribution = calc_distribution(planets_sr)
 
-    return {
+    return ORJSONResponse({
         "anno": data.current_year,
         "momento_esatto_jd": round(jd_search, 4),
         "pianeti": planets_sr,
@@ -718,54 +919,65 @@ def solar_return(data: SolarReturnRequest):
             "medio_cielo": {"segno": mc_sign, "gradi": mc_deg}
         },
         "nodi": calc_nodes(jd_search),
-        "aspetti": aspects[:15],
+        "aspetti": top_aspects(aspects, 15),
         "pattern": patterns,
         "distribuzione": distribution
-    }
+    })
 
 @app.post("/compatibility")
 def compatibility(data: CompatibilityRequest):
+    return ORJSONResponse(calc_compatibility(data))
+
+@lru_cache(maxsize=1024)
+def calc_compatibility(data: CompatibilityRequest):
+    # Dipende solo dai dati delle due persone: coppie ripetute non ricalcolano nulla
     jd1 = calc_jd(data.person1_year, data.person1_month, data.person1_day,
                   data.person1_hour, data.person1_minute)
     jd2 = calc_jd(data.person2_year, data.person2_month, data.person2_day,
                   data.person2_hour, data.person2_minute)
 
-    planets1, planets2 = {}, {}
-    for name, pid in PLANETS.items():
-        pd1 = planet_data(jd1, pid)
-        pd1['dignita'] = calc_dignity(name, pd1['segno'])
-        planets1[name] = pd1
-        pd2 = planet_data(jd2, pid)
-        pd2['dignita'] = calc_dignity(name, pd2['segno'])
-        planets2[name] = pd2
+    planets1, planets2 = calc_planets(jd1), calc_planets(jd2)
+    for name in PLANET_NAMES:
+        planets1[name]['dignita'] = calc_dignity(name, planets1[name]['segno'])
+        planets2[name]['dignita'] = calc_dignity(name, planets2[name]['segno'])
 
-    houses1, ascmc1 = swe.houses(jd1, data.person1_lat, data.person1_lon, b'P')
-    houses2, ascmc2 = swe.houses(jd2, data.person2_lat, data.person2_lon, b'P')
+    houses1, ascmc1 = calc_houses(jd1, data.person1_lat, data.person1_lon)
+    houses2, ascmc2 = calc_houses(jd2, data.person2_lat, data.person2_lon)
 
     asc1_sign, asc1_deg = deg_to_sign(ascmc1[0])
     asc2_sign, asc2_deg = deg_to_sign(ascmc2[0])
     mc1_sign, mc1_deg = deg_to_sign(ascmc1[1])
     mc2_sign, mc2_deg = deg_to_sign(ascmc2[1])
 
-    longs1 = {n: pd['longitudine'] for n, pd in planets1.items()}
-    longs2 = {n: pd['longitudine'] for n, pd in planets2.items()}
+    longs1 = longitudes(planets1)
+    longs2 = longitudes(planets2)
     longs1['ascendente'] = ascmc1[0]
     longs2['ascendente'] = ascmc2[0]
 
     # Sinastrìa
-    sinastria = calc_aspects(longs1, longs2, "P1:", "P2:")
+    # Ordinata per orb: lo score si somma in quest'ordine e le liste sono suoi prefissi
+    sinastria = sorted(calc_aspects(longs1, longs2, "P1:", "P2:"), key=ORB_KEY)
 
     # Carta composita
     composita = calc_composite(planets1, planets2, ascmc1[0], ascmc2[0])
-    comp_longs = {n: v['longitudine'] for n, v in composita.items() if 'longitudine' in v}
-    composita_aspects = calc_aspects(comp_longs, comp_longs)
-    composita_patterns = detect_patterns({n: v['longitudine'] for n, v in composita.items() if n != 'ascendente' and 'longitudine' in v})
-
-    # Score compatibilità
+    # Una sola mappa dei pianeti compositi: i pattern la usano così, gli aspetti con l'ascendente
+    comp_longs = longitudes(composita)
+    comp_asc = comp_longs.pop('ascendente')
+    comp_points = {**comp_longs, 'ascendente': comp_asc}
+    composita_aspects = calc_aspects(comp_points, comp_points)
+    composita_patterns = detect_patterns(comp_longs)
+
+    # Score compatibilità; nella stessa passata (sinastria ordinata per orb)
+    # i primi 10 armonici e 8 di tensione
     score = 0
+    armonici, tensione = [], []
     for a in sinastria:
-        if a['tipo'] == 'armonico': score += max(0, 8 - a['orb'])
-        elif a['tipo'] == 'tensione': score -= max(0, 4 - a['orb'])
+        if a['tipo'] == 'armonico':
+            score += max(0, 8 - a['orb'])
+            if len(armonici) < 10: armonici.append(a)
+        elif a['tipo'] == 'tensione':
+            score -= max(0, 4 - a['orb'])
+            if len(tensione) < 8: tensione.append(a)
     compat_pct = min(100, max(0, int(50 + score * 2)))
 
     # Distribuzione per entrambi
@@ -795,12 +1007,12 @@ def compatibility(data: CompatibilityRequest):
         },
         "sinastria": {
             "tutti": sinastria[:20],
-            "armonici": [a for a in sinastria if a['tipo']=='armonico'][:10],
-            "tensione": [a for a in sinastria if a['tipo']=='tensione'][:8],
+            "armonici": armonici,
+            "tensione": tensione,
         },
         "carta_composita": {
             "pianeti": composita,
-            "aspetti": composita_aspects[:12],
+            "aspetti": top_aspects(composita_aspects, 12),
             "pattern": composita_patterns,
         },
         "compatibilita_percentuale": compat_pct,
@@ -810,24 +1022,27 @@ def compatibility(data: CompatibilityRequest):
 
 @app.post("/progressions")
 def secondary_progressions(data: ProgressionRequest):
+    return ORJSONResponse(calc_progressions(data))
+
+@lru_cache(maxsize=1024)
+def calc_progressions(data: ProgressionRequest):
+    # Stessi dati di nascita ed età → stessa carta progressa
     jd_natal = calc_jd(data.birth_year, data.birth_month, data.birth_day,
                        data.birth_hour, data.birth_minute)
     prog_planets = calc_secondary_progressions(jd_natal, data.age_years)
 
     # Confronta con natale
-    natal_planets = {}
-    for name, pid in PLANETS.items():
-        natal_planets[name] = planet_data(jd_natal, pid)
+    natal_planets = calc_planets(jd_natal)
 
-    prog_longs = {n: pd['longitudine'] for n, pd in prog_planets.items()}
-    natal_longs = {n: pd['longitudine'] for n, pd in natal_planets.items()}
+    prog_longs = longitudes(prog_planets)
+    natal_longs = longitudes(natal_planets)
     aspects = calc_aspects(prog_longs, natal_longs, "P:", "N:")
 
     return {
         "eta": data.age_years,
         "pianeti_progressati": prog_planets,
         "pianeti_natali": natal_planets,
-        "aspetti_progressati": aspects[:15],
+        "aspetti_progressati": top_aspects(aspects, 15),
         "sole_progressato": prog_planets.get('sole', {}),
         "luna_progressata": prog_planets.get('luna', {}),
     }
@@ -835,23 +1050,25 @@ def secondary_progressions(data: ProgressionRequest):
 @app.get("/lunar_phases")
 def lunar_phases():
     """Prossime 4 fasi lunari"""
-    now = datetime.utcnow()
-    jd_now = calc_jd(now.year, now.month, now.day, now.hour, now.minute)
+    now, jd_now = utc_now()
+    # Le fasi si calcolano una volta all'ora; qui si scartano solo quelle già passate
+    hour_phases = upcoming_phases(calc_jd(now.year, now.month, now.day, now.hour))
+    phases = [{"nome": LUNAR_PHASE_NAMES[q % 4], "data": jd_to_date_str(jd), "jd": round(jd, 2)}
+              for q, jd in hour_phases if jd >= jd_now][:8]
+    return ORJSONResponse({"fasi": phases})
+
+@lru_cache(maxsize=2)
+def upcoming_phases(jd_hour):
+    # (q, jd) delle 9 fasi dopo l'inizio dell'ora: nella stessa ora ne può passare al più una.
+    # Lunazione di partenza stimata dal jd, arretrata di una per non saltare fasi imminenti
+    q = 4 * (math.floor((jd_hour - 2451550.09766) / 29.530588861) - 1)
     phases = []
-    jd = jd_now
-    found = 0
-    while found < 8:
-        sun_pos, _ = swe.calc_ut(jd, swe.SUN, swe.FLG_MOSEPH)
-        moon_pos, _ = swe.calc_ut(jd, swe.MOON, swe.FLG_MOSEPH)
-        angle = (moon_pos[0] - sun_pos[0]) % 360
-        for target, name in [(0,"Luna Nuova 🌑"),(90,"Primo Quarto 🌓"),(180,"Luna Piena 🌕"),(270,"Ultimo Quarto 🌗")]:
-            diff = (angle - target) % 360
-            if diff < 1 or diff > 359:
-                dt = datetime(1858, 11, 17) + timedelta(days=jd - 2400000.5)
-                phases.append({"nome": name, "data": dt.strftime("%d/%m/%Y"), "jd": round(jd, 2)})
-                found += 1
-        jd += 0.5
-    return {"fasi": phases[:8]}
+    while len(phases) < 9:
+        jd = phase_instant(q)
+        if jd >= jd_hour:
+            phases.append((q, jd))
+        q += 1
+    return tuple(phases)
 
 @app.post("/ephemeris")
 def ephemeris_range(data: BirthData):
@@ -860,10 +1077,26 @@ def ephemeris_range(data: BirthData):
     result = []
     for i in range(7):
         jd = jd_start + i
+        # Solo segno/gradi/moto: direttamente dal batch, senza il record completo di planet_record
         day_data = {}
-        for name, pid in PLANETS.items():
-            pd = planet_data(jd, pid)
-            day_data[name] = {"segno": pd['segno'], "gradi": pd['gradi'], "retrogrado": pd['retrogrado']}
-        dt = datetime(1858, 11, 17) + timedelta(days=jd - 2400000.5)
-        result.append({"data": dt.strftime("%d/%m/%Y"), "pianeti": day_data})
-    return {"efemeridi": result}
+        for name, pos in zip(PLANET_NAMES, calc_ut_batch(jd)):
+            sign, deg = deg_to_sign(pos[0])
+            day_data[name] = {"segno": sign, "gradi": deg, "retrogrado": pos[3] < 0}
+        result.append({"data": jd_to_date_str(jd), "pianeti": day_data})
+    return ORJSONResponse({"efemeridi": result})
+
+@app.post("/cache_clear")
+def cache_clear():
+    """Svuota le cache di julian day e posizioni planetarie"""
+    calc_jd.cache_clear()
+    calc_ut_cached.cache_clear()
+    calc_ut_batch.cache_clear()
+    calc_houses.cache_clear()
+    natal_longitudes.cache_clear()
+    calc_natal_chart.cache_clear()
+    calc_today.cache_clear()
+    calc_transits.cache_clear()
+    calc_compatibility.cache_clear()
+    calc_progressions.cache_clear()
+    upcoming_phases.cache_clear()
+    return {"status": "cache svuotata"}